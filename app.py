@@ -5,20 +5,28 @@
 import os
 import io
 import re
+import time
 import asyncio
-import json
+import hashlib
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Optional
 from html import unescape
 from contextlib import asynccontextmanager
 
+import orjson
 from dotenv import load_dotenv
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends
-from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Request
+from fastapi.responses import HTMLResponse, StreamingResponse, ORJSONResponse, Response
+from fastapi.staticfiles import StaticFiles
+from starlette.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel, field_validator
 import uvicorn
 
 # AI
 import google.generativeai as genai
+from google.api_core import exceptions as gapi_exceptions
 
 # File handling
 import docx
@@ -28,7 +36,7 @@ import fitz  # PyMuPDF
 from fpdf import FPDF
 
 # Database (SQLAlchemy)
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, func
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, event, func, text as sql_text
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
 
 # --- 0. CONFIG ---
@@ -37,9 +45,20 @@ API_KEY = os.getenv("GOOGLE_API_KEY", "")
 if not API_KEY:
     print("⚠️ GOOGLE_API_KEY not found in environment. Make sure to set it in .env")
 
+MODEL_NAME = "gemini-1.5-flash"
+
+# One client + one GenerativeModel for the whole process: every call reuses the
+# configured transport's connection pool instead of paying per-request TLS and
+# auth setup. GENAI_TRANSPORT ("rest"/"grpc") is exposed for deployments where
+# one transport pools connections better than the other.
+model = None
 try:
-    genai.configure(api_key=API_KEY)
-    model = genai.GenerativeModel('gemini-1.5-flash')
+    _transport = os.getenv("GENAI_TRANSPORT")
+    if _transport:
+        genai.configure(api_key=API_KEY, transport=_transport)
+    else:
+        genai.configure(api_key=API_KEY)
+    model = genai.GenerativeModel(MODEL_NAME)
     print("✅ Successfully configured Google AI.")
 except Exception as e:
     print(f"🔴 CRITICAL ERROR: Failed to configure Google AI. Check API key. Details: {e}")
@@ -51,14 +70,28 @@ SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
 
 
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, _connection_record):
+    """WAL so reads don't block on writes, plus mmap/cache tuning for read throughput."""
+    cur = dbapi_conn.cursor()
+    cur.executescript(
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA synchronous=NORMAL;"
+        "PRAGMA mmap_size=268435456;"
+        "PRAGMA cache_size=-64000;"
+        "PRAGMA temp_store=MEMORY;"
+    )
+    cur.close()
+
+
 class Law(Base):
     __tablename__ = "laws"
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(400), nullable=False)
-    jurisdiction = Column(String(120), default="India")
+    jurisdiction = Column(String(120), default="India", index=True)
     tags = Column(String(400), default="")
     text = Column(Text, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
 
 class SuggestionRecord(Base):
@@ -73,6 +106,61 @@ class SuggestionRecord(Base):
 Base.metadata.create_all(bind=engine)
 
 
+def setup_fts(engine):
+    """Create the laws_fts FTS5 index (external content on `laws`) and keep it in sync via triggers."""
+    ddl = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS laws_fts USING fts5(
+        title, tags, text, jurisdiction UNINDEXED,
+        content='laws', content_rowid='id',
+        tokenize="unicode61 remove_diacritics 2",
+        prefix='2 3 4'
+    );
+    CREATE TRIGGER IF NOT EXISTS laws_fts_ai AFTER INSERT ON laws BEGIN
+        INSERT INTO laws_fts(rowid, title, tags, text, jurisdiction)
+        VALUES (new.id, new.title, new.tags, new.text, new.jurisdiction);
+    END;
+    CREATE TRIGGER IF NOT EXISTS laws_fts_ad AFTER DELETE ON laws BEGIN
+        INSERT INTO laws_fts(laws_fts, rowid, title, tags, text, jurisdiction)
+        VALUES ('delete', old.id, old.title, old.tags, old.text, old.jurisdiction);
+    END;
+    CREATE TRIGGER IF NOT EXISTS laws_fts_au AFTER UPDATE ON laws BEGIN
+        INSERT INTO laws_fts(laws_fts, rowid, title, tags, text, jurisdiction)
+        VALUES ('delete', old.id, old.title, old.tags, old.text, old.jurisdiction);
+        INSERT INTO laws_fts(rowid, title, tags, text, jurisdiction)
+        VALUES (new.id, new.title, new.tags, new.text, new.jurisdiction);
+    END;
+    """
+    try:
+        raw = engine.raw_connection()
+        try:
+            raw.executescript(ddl)
+            # create_all only creates indexes for new tables, so cover pre-existing DBs too.
+            raw.executescript(
+                "CREATE INDEX IF NOT EXISTS ix_laws_jurisdiction ON laws (jurisdiction);"
+                "CREATE INDEX IF NOT EXISTS ix_laws_created_at ON laws (created_at);"
+            )
+            # Rebuild only when the index is out of step with the content table
+            # (pre-existing laws.db, or an interrupted earlier rebuild). An
+            # unconditional rebuild would reindex the full corpus on every boot
+            # of every worker, all serializing on SQLite's write lock. Counting
+            # laws_fts itself won't do - external-content FTS delegates count(*)
+            # to the content table - so count the docsize shadow table, which
+            # tracks what is actually indexed.
+            law_count = raw.execute("SELECT count(*) FROM laws").fetchone()[0]
+            fts_count = raw.execute("SELECT count(*) FROM laws_fts_docsize").fetchone()[0]
+            if fts_count != law_count:
+                raw.execute("INSERT INTO laws_fts(laws_fts) VALUES('rebuild')")
+            raw.commit()
+        finally:
+            raw.close()
+        print("✅ FTS5 index 'laws_fts' is ready.")
+    except Exception as e:
+        print(f"🔴 Failed to set up FTS5 index (law search will fall back to LIKE): {e}")
+
+
+setup_fts(engine)
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -81,73 +169,483 @@ def get_db():
         db.close()
 
 # --- 2. UTILITIES & HELPERS ---
-def sanitize_for_pdf(text: str) -> str:
-    return text.encode("latin-1", "replace").decode("latin-1")
+# google-re2 is a DFA engine: linear-time scans on arbitrarily large
+# user-supplied documents and immune to catastrophic backtracking. Fall back
+# to stdlib re when the binding isn't installed.
+try:
+    import re2 as _scan_re
+except ImportError:
+    _scan_re = re
+
+# numpy only pays off on very large token sets (vectorised unique/partition
+# beat Counter's C loop once Python-level iteration dominates). Optional:
+# small documents and numpy-less installs take the Counter path.
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
+
+# Hot-path regexes, compiled once at import so per-call lookups skip re's
+# small shared pattern cache. _WORD_RE runs over whole uploaded documents,
+# so it gets the DFA engine; the FTS tokenizer only sees short query strings.
+_WORD_RE = _scan_re.compile(r"\b[a-zA-Z]{5,}\b")
+_FTS_TOKEN_RE = re.compile(r"\w+")
+
+
+# Punctuation the model likes to emit that latin-1 would otherwise turn into
+# '?'. Built once at import; str.translate runs the mapping in C.
+_SANITIZE_TABLE = str.maketrans({
+    '‘': "'", '’': "'", '‚': "'",   # curly single quotes
+    '“': '"', '”': '"', '„': '"',   # curly double quotes
+    '–': '-', '—': '-',                  # en/em dashes
+    '…': '...',
+    '•': '*',
+    ' ': ' ',
+    '₹': 'Rs. ',                              # rupee sign
+})
 
 
-def extract_text_from_file(file: UploadFile) -> str:
-    filename = file.filename or ""
+def sanitize_for_pdf(text: str) -> str:
+    # ASCII (the overwhelmingly common case for generated reports) is already
+    # valid latin-1; isascii() is a single C-level scan, so we skip the
+    # encode/decode round-trip and its two full copies entirely.
+    if not text or text.isascii():
+        return text
+    return text.translate(_SANITIZE_TABLE).encode("latin-1", "replace").decode("latin-1")
+
+
+def _strip_tags(html: str) -> str:
+    """Remove <...> tags with a linear scan.
+
+    Uses str.find (CPython's C string search) to hop between '<' and '>'
+    instead of running the regex engine over every character.
+    """
+    lt = html.find('<')
+    if lt == -1:
+        return html
+    out = []
+    # Hoist bound methods out of the loop; each iteration is then two C-level
+    # searches and a slice, with no attribute lookups.
+    find = html.find
+    append = out.append
+    i = 0
+    n = len(html)
+    while i < n:
+        lt = find('<', i)
+        if lt == -1:
+            append(html[i:])
+            break
+        append(html[i:lt])
+        gt = find('>', lt + 1)
+        if gt == -1:
+            append(html[lt:])
+            break
+        i = gt + 1
+    return ''.join(out)
+
+
+# Created in the lifespan handler; extraction runs on other cores so a big PDF
+# never stalls this worker's event loop.
+EXTRACT_EXECUTOR: Optional[ProcessPoolExecutor] = None
+
+
+def _extract_bytes(filename: str, data: bytes) -> str:
+    """Extract text from raw upload bytes.
+
+    Module-level with bytes-only arguments so it pickles cleanly into the
+    process pool.
+    """
+    name = filename.lower()
+    if name.endswith(".pdf"):
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            # TEXTFLAGS_TEXT skips image and annotation handling - the fastest
+            # text-only extraction path PyMuPDF offers.
+            return "\n".join([page.get_text(flags=fitz.TEXTFLAGS_TEXT) for page in doc])
+    elif name.endswith(".docx"):
+        docx_doc = docx.Document(io.BytesIO(data))
+        return "\n".join([p.text for p in docx_doc.paragraphs])
+    elif name.endswith(".txt"):
+        return data.decode("utf-8", errors="ignore")
+    raise ValueError("Unsupported file type. Use .pdf, .docx or .txt")
+
+
+async def extract_text_from_file(file: UploadFile) -> str:
+    data = await file.read()
     try:
-        if filename.lower().endswith(".pdf"):
-            data = file.file.read()
-            with fitz.open(stream=data, filetype="pdf") as doc:
-                return "\n".join([page.get_text() for page in doc])
-        elif filename.lower().endswith(".docx"):
-            data = file.file.read()
-            docx_doc = docx.Document(io.BytesIO(data))
-            return "\n".join([p.text for p in docx_doc.paragraphs])
-        elif filename.lower().endswith(".txt"):
-            return file.file.read().decode("utf-8", errors="ignore")
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file type. Use .pdf, .docx or .txt")
+        if EXTRACT_EXECUTOR is not None:
+            return await asyncio.get_running_loop().run_in_executor(
+                EXTRACT_EXECUTOR, _extract_bytes, file.filename or "", data
+            )
+        return _extract_bytes(file.filename or "", data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process file: {e}")
 
 
+class AIResponseCache:
+    """In-memory TTL cache with LRU eviction, keyed by SHA-256 of a normalized prompt."""
+
+    def __init__(self, ttl: int = 3600, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._store = OrderedDict()  # key -> (value, expires_at)
+
+    @staticmethod
+    def make_key(prompt: str) -> str:
+        return hashlib.sha256(f"{MODEL_NAME}|{prompt.strip().lower()}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.monotonic() > expires_at:
+            del self._store[key]
+            return None
+        self._store.move_to_end(key)
+        return value
+
+    def set(self, key: str, value):
+        now = time.monotonic()
+        # Opportunistic purge of expired entries so the map doesn't fill with dead weight.
+        for k in [k for k, (_, exp) in self._store.items() if now > exp]:
+            del self._store[k]
+        self._store[key] = (value, now + self.ttl)
+        self._store.move_to_end(key)
+        while len(self._store) > self.max_entries:
+            self._store.popitem(last=False)
+
+
+AI_CACHE = AIResponseCache(
+    ttl=int(os.getenv("AI_CACHE_TTL", "3600")),
+    max_entries=int(os.getenv("AI_CACHE_MAX_ENTRIES", "10000")),
+)
+
+# Singleflight map: when N identical prompts are in flight at once (e.g. a
+# class demo analyzing the same document), the first drives the Gemini call
+# and the rest await its future.
+_INFLIGHT = {}  # cache key -> asyncio.Future
+
+# Concurrency ceiling for outbound Gemini calls: an unbounded fan-out under
+# load just trades useful throughput for provider 429s and retries.
+_GEMINI_SEM = asyncio.Semaphore(int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")))
+_GEMINI_MAX_RETRIES = 5
+_GEMINI_RETRY_BASE_DELAY = 0.5  # seconds; doubles per attempt
+
+
+class _TokenBucket:
+    """Wall-clock token bucket: cheap client-side sleeps instead of server 429s.
+
+    The semaphore caps how many calls are in flight at once; this caps how many
+    start per second, since a burst of allowed-concurrency calls can still blow
+    through a per-minute quota.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+_GEMINI_BUCKET = _TokenBucket(rate=float(os.getenv("GEMINI_RPS", "10")), capacity=20)
+
+
+async def _generate_with_limits(prompt: str):
+    """Call Gemini under the concurrency and rate caps, backing off exponentially on rate limits."""
+    async with _GEMINI_SEM:
+        for attempt in range(_GEMINI_MAX_RETRIES):
+            try:
+                await _GEMINI_BUCKET.acquire()
+                return await model.generate_content_async(prompt)
+            except gapi_exceptions.ResourceExhausted:
+                if attempt == _GEMINI_MAX_RETRIES - 1:
+                    raise
+                delay = _GEMINI_RETRY_BASE_DELAY * (2 ** attempt)
+                print(f"⚠️ Gemini rate-limited, retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+# Server-side negotiation chats keyed by session id, so each turn sends only the
+# new message instead of replaying (and re-prefilling) the whole history.
+# Entries expire after a TTL of inactivity (refreshed on use) on top of the LRU
+# size bound, so abandoned chats don't pin memory for the process lifetime.
+NEGOTIATION_SESSIONS = OrderedDict()  # session_id -> (ChatSession, expires_at)
+_MAX_NEGOTIATION_SESSIONS = 256
+_NEGOTIATION_SESSION_TTL = int(os.getenv("NEGOTIATION_SESSION_TTL", "3600"))
+_NEGOTIATION_LOCK = asyncio.Lock()
+
+
+async def store_negotiation_session(session_id: str, chat):
+    async with _NEGOTIATION_LOCK:
+        now = time.monotonic()
+        for sid in [sid for sid, (_, exp) in NEGOTIATION_SESSIONS.items() if now > exp]:
+            del NEGOTIATION_SESSIONS[sid]
+        NEGOTIATION_SESSIONS[session_id] = (chat, now + _NEGOTIATION_SESSION_TTL)
+        NEGOTIATION_SESSIONS.move_to_end(session_id)
+        while len(NEGOTIATION_SESSIONS) > _MAX_NEGOTIATION_SESSIONS:
+            NEGOTIATION_SESSIONS.popitem(last=False)
+
+
+async def get_negotiation_session(session_id: str):
+    async with _NEGOTIATION_LOCK:
+        entry = NEGOTIATION_SESSIONS.get(session_id)
+        if entry is None:
+            return None
+        chat, expires_at = entry
+        now = time.monotonic()
+        if now > expires_at:
+            del NEGOTIATION_SESSIONS[session_id]
+            return None
+        NEGOTIATION_SESSIONS[session_id] = (chat, now + _NEGOTIATION_SESSION_TTL)
+        NEGOTIATION_SESSIONS.move_to_end(session_id)
+        return chat
+
+
 async def get_ai_response(prompt: str) -> str:
     try:
-        if not API_KEY:
+        if not API_KEY or model is None:
             return "AI API key not configured."
-        out = await model.generate_content_async(prompt)
-        return out.text if hasattr(out, "text") else str(out)
+        key = AIResponseCache.make_key(prompt)
+        cached = AI_CACHE.get(key)
+        if cached is not None:
+            return cached
+        existing = _INFLIGHT.get(key)
+        if existing is not None:
+            # shield() keeps one cancelled waiter from cancelling the shared future.
+            return await asyncio.shield(existing)
+        fut = asyncio.get_running_loop().create_future()
+        _INFLIGHT[key] = fut
+        try:
+            out = await _generate_with_limits(prompt)
+            text = out.text if hasattr(out, "text") else str(out)
+            AI_CACHE.set(key, text)
+            fut.set_result(text)
+        except Exception as e:
+            print("AI Error:", e)
+            text = f"AI error: {e}"
+            fut.set_result(text)
+        finally:
+            _INFLIGHT.pop(key, None)
+            # If the driving task was cancelled (client gone mid-request),
+            # CancelledError skipped both set_result calls above - cancel the
+            # future so shielded waiters fail fast instead of hanging forever.
+            if not fut.done():
+                fut.cancel()
+        return text
     except Exception as e:
         print("AI Error:", e)
         return f"AI error: {e}"
 
+# Suggestion persistence is fire-and-forget: requests enqueue records and a
+# single background writer commits them in batches, so the per-request fsync
+# disappears from the endpoint's latency and amortizes across a batch.
+_SUGGESTION_QUEUE: asyncio.Queue = asyncio.Queue()
+_SUGGESTION_BATCH_MAX = 100
+
+
+async def _suggestion_writer():
+    while True:
+        batch = [await _SUGGESTION_QUEUE.get()]
+        while len(batch) < _SUGGESTION_BATCH_MAX and not _SUGGESTION_QUEUE.empty():
+            batch.append(_SUGGESTION_QUEUE.get_nowait())
+
+        def _write(records):
+            s = SessionLocal()
+            try:
+                s.add_all(records)
+                s.commit()
+            finally:
+                s.close()
+
+        try:
+            await asyncio.to_thread(_write, batch)
+        except Exception as e:
+            print("Suggestion store error:", e)
+
+
+def _trim_history(hist: list, max_chars: int = 8000) -> list:
+    """Cap a chat history at a character budget.
+
+    Keeps the first turn (it frames the negotiation and embeds the document)
+    plus as many of the most recent turns as fit, so prompt size stays O(1)
+    instead of growing with session length.
+    """
+    if not hist:
+        return hist
+
+    def turn_len(turn):
+        return sum(len(str(p)) for p in turn.get('parts', []))
+
+    first = hist[0]
+    budget = max_chars - turn_len(first)
+    kept = []
+    for turn in reversed(hist[1:]):
+        budget -= turn_len(turn)
+        if budget < 0 and kept:
+            break
+        kept.append(turn)
+    kept.reverse()
+    return [first] + kept
+
+
+def _relevant_excerpts(document_text: str, question: str, chunk_size: int = 1500, top_k: int = 3) -> str:
+    """Pick the top-k document chunks by question-term overlap.
+
+    Crude lexical retrieval, but it keeps /ask prompts at a fixed size instead
+    of shipping the entire document to the model for every question.
+    """
+    if len(document_text) <= chunk_size * top_k:
+        return document_text
+    terms = {m.group().lower() for m in _WORD_RE.finditer(question)} - _STOPWORDS
+    if not terms:
+        return document_text[:chunk_size * top_k]
+    chunks = [document_text[i:i + chunk_size] for i in range(0, len(document_text), chunk_size)]
+    scored = []
+    for idx, chunk in enumerate(chunks):
+        low = chunk.lower()
+        scored.append((sum(low.count(t) for t in terms), idx))
+    # Best-scoring chunks, stitched back together in document order.
+    top = sorted(sorted(scored, reverse=True)[:top_k], key=lambda pair: pair[1])
+    return "\n...\n".join(chunks[idx] for _, idx in top)
+
+
+async def get_ai_responses(prompts: List[str]) -> List[str]:
+    """Run several prompts concurrently; per-prompt failures come back as error strings."""
+    return list(await asyncio.gather(*(get_ai_response(p) for p in prompts)))
+
+
 # --- MODIFIED: This function now reads from sample_laws.json ---
 def seed_sample_laws(db: Session):
     """Seed DB from sample_laws.json if the DB is empty."""
-    if db.query(Law).count() > 0:
+    # Existence probe: stops at the first row instead of aggregating the table.
+    if db.query(Law.id).first() is not None:
         return
 
     try:
-        with open("sample_laws.json", "r", encoding="utf-8") as f:
-            sample_laws = json.load(f)
+        with open("sample_laws.json", "rb") as f:
+            sample_laws = orjson.loads(f.read())
         
-        for s in sample_laws:
-            db.add(Law(
-                title=s.get("title", "No Title"),
-                jurisdiction=s.get("jurisdiction", "India"),
-                tags=s.get("tags", ""),
-                text=s.get("text", "")
-            ))
+        # One executemany instead of one INSERT (plus ORM bookkeeping) per row.
+        db.bulk_insert_mappings(Law, [
+            {
+                "title": s.get("title", "No Title"),
+                "jurisdiction": s.get("jurisdiction", "India"),
+                "tags": s.get("tags", ""),
+                "text": s.get("text", ""),
+            }
+            for s in sample_laws
+        ])
         db.commit()
         print(f"✅ Seeded {len(sample_laws)} sample laws into DB from sample_laws.json.")
     except FileNotFoundError:
         print("⚠️ 'sample_laws.json' not found. No laws were seeded.")
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         print("🔴 Error decoding 'sample_laws.json'. Please check if it is a valid JSON file.")
     except Exception as e:
         print(f"🔴 An unexpected error occurred while seeding laws: {e}")
 
 
+# Legal boilerplate (5+ letters, so everything _WORD_RE can emit) that carries
+# no signal for matching a document against the laws corpus.
+_STOPWORDS = frozenset({
+    "about", "above", "after", "agree", "agreement", "agreements", "along",
+    "before", "being", "below", "between", "clause", "clauses", "could",
+    "document", "documents", "during", "either", "every", "first", "following",
+    "hereby", "herein", "hereinafter", "hereof", "hereto", "included",
+    "includes", "including", "limited", "notwithstanding", "other", "otherwise",
+    "parties", "party", "provided", "pursuant", "respect", "section",
+    "sections", "shall", "should", "their", "there", "thereof", "these",
+    "third", "those", "under", "unless", "until", "where", "whereas", "which",
+    "within", "without", "would",
+})
+
+
+# Rough cutover point (~10k tokens at ~6 chars/word): below it Counter wins,
+# above it the numpy array build amortises.
+_NUMPY_KEYWORD_MIN_CHARS = 60_000
+
+
+def extract_keywords(text: str, max_terms: int = 32):
+    """Most-frequent stopword-free 5+ letter words from a document.
+
+    One streaming pass: finditer avoids lowercasing the whole document or
+    building a list of every word, and Counter tallies in C, so ranking is
+    O(n) instead of the old O(n*unique) words.count pattern. For very large
+    documents (100k-word contracts) the per-token Python iteration itself
+    becomes the cost, so when numpy is available we materialise the tokens
+    once and rank with vectorised unique + argpartition instead.
+    """
+    words = (w for w in (m.group().lower() for m in _WORD_RE.finditer(text)) if w not in _STOPWORDS)
+    if _np is not None and len(text) > _NUMPY_KEYWORD_MIN_CHARS:
+        arr = _np.array(list(words))
+        if arr.size:
+            uniq, cnt = _np.unique(arr, return_counts=True)
+            k = min(max_terms, cnt.size)
+            idx = _np.argpartition(-cnt, k - 1)[:k]
+            idx = idx[_np.argsort(-cnt[idx])]
+            return uniq[idx].tolist()
+        return []
+    return [w for w, _ in Counter(words).most_common(max_terms)]
+
+
+def fts_match_expr(q: str) -> str:
+    """Escape a free-text query into a safe FTS5 expression of OR'd prefix phrases."""
+    tokens = _FTS_TOKEN_RE.findall(q)
+    return " OR ".join(f'"{t}"*' for t in tokens)
+
+
 def simple_law_search(db: Session, q: Optional[str] = None, jurisdiction: Optional[str] = None, limit: int = 10):
-    qexpr = f"%{q.strip()}%" if q else "%"
+    if q:
+        match = fts_match_expr(q)
+        if match:
+            try:
+                if jurisdiction:
+                    # Materialize the MATCH in a CTE first: mixing MATCH with a LIKE in one
+                    # WHERE makes SQLite drop the FTS index and scan. Overfetch 10x so the
+                    # jurisdiction filter still has enough candidates to fill the limit.
+                    stmt = sql_text(
+                        "WITH fts_matches AS ("
+                        "    SELECT rowid, bm25(laws_fts) AS score FROM laws_fts"
+                        "    WHERE laws_fts MATCH :match ORDER BY score LIMIT :prefetch"
+                        ") "
+                        "SELECT l.* FROM fts_matches fm JOIN laws l ON l.id = fm.rowid "
+                        "WHERE l.jurisdiction LIKE :jur ORDER BY fm.score LIMIT :limit"
+                    )
+                    return db.query(Law).from_statement(stmt).params(
+                        match=match, jur=f"%{jurisdiction}%", prefetch=limit * 10, limit=limit
+                    ).all()
+                stmt = sql_text(
+                    "SELECT l.* FROM laws_fts f JOIN laws l ON l.id = f.rowid "
+                    "WHERE laws_fts MATCH :match ORDER BY bm25(laws_fts) LIMIT :limit"
+                )
+                return db.query(Law).from_statement(stmt).params(match=match, limit=limit).all()
+            except Exception as e:
+                print(f"⚠️ FTS search failed, falling back to LIKE: {e}")
+                # The failed execute invalidated the session's transaction;
+                # without a rollback the fallback query itself would raise.
+                db.rollback()
+                qexpr = f"%{q.strip()}%"
+                query = db.query(Law)
+                if jurisdiction:
+                    query = query.filter(Law.jurisdiction.ilike(f"%{jurisdiction}%"))
+                query = query.filter((Law.title.ilike(qexpr)) | (Law.tags.ilike(qexpr)) | (Law.text.ilike(qexpr)))
+                return query.order_by(Law.created_at.desc()).limit(limit).all()
     query = db.query(Law)
     if jurisdiction:
         query = query.filter(Law.jurisdiction.ilike(f"%{jurisdiction}%"))
-    if q:
-        query = query.filter((Law.title.ilike(qexpr)) | (Law.tags.ilike(qexpr)) | (Law.text.ilike(qexpr)))
     return query.order_by(Law.created_at.desc()).limit(limit).all()
 
 # --- 3. Pydantic Schemas ---
@@ -159,6 +657,7 @@ class AskRequest(BaseModel):
 class NegotiateRequest(BaseModel):
     history: list
     user_message: str
+    session_id: Optional[str] = None
 
 class CompareRequest(BaseModel):
     clause_a: str
@@ -180,6 +679,9 @@ class LawSearchRequest(BaseModel):
     language: Optional[str] = "en"
     jurisdiction: Optional[str] = "Chennai"
 
+class BatchAIRequest(BaseModel):
+    prompts: List[str]
+
 # --- 4. PDF Helper ---
 class PDF(FPDF):
     def header(self):
@@ -196,10 +698,11 @@ class PDF(FPDF):
         self.cell(0, 10, sanitize_for_pdf(title), 0, 1, 'L')
         self.ln(2)
     def write_html_content(self, html):
-        clean_html = re.sub('<[^<]+?>', '', unescape(html))
+        # Sanitize the whole blob once instead of re-entering the codec per line.
+        clean_html = sanitize_for_pdf(_strip_tags(unescape(html)))
         self.set_font('Helvetica', '', 10)
         for line in clean_html.split('\n'):
-            if line.strip(): self.multi_cell(0, 5, sanitize_for_pdf(line.strip()))
+            if line.strip(): self.multi_cell(0, 5, line.strip())
         self.ln()
 
 # --- 5. FRONTEND (HTML, CSS, JS) ---
@@ -211,7 +714,7 @@ HTML_TEMPLATE = """
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title data-translate-key="title">Advanced Legal AI Dashboard</title>
     <link href="https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;600;700&display=swap" rel="stylesheet">
-    <style>{{ css_code }}</style>
+    <link rel="stylesheet" href="/static/app.css">
 </head>
 <body>
     <canvas id="particle-canvas"></canvas>
@@ -316,7 +819,7 @@ HTML_TEMPLATE = """
         <p data-translate-key="built_by">Built by Visoneers. For updates or changes, contact: <a href="mailto:sanjaymurugadoss02@gmail.com">sanjaymurugadoss02@gmail.com</a></p>
         <p data-translate-key="disclaimer">Disclaimer: This AI tool is for informational purposes only and is not a substitute for professional legal advice.</p>
     </footer>
-    <script>{{ js_code }}</script>
+    <script src="/static/app.js" defer></script>
 </body>
 </html>
 """
@@ -469,7 +972,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }, 1500);
 
     // --- Global State & Elements ---
-    let currentDocumentText = '', negotiationHistory = [];
+    let currentDocumentText = '', negotiationHistory = [], negotiationSessionId = null;
     const langSelector = document.getElementById('languageSelector');
 
     // --- Helper Functions (Restored) ---
@@ -530,6 +1033,36 @@ document.addEventListener('DOMContentLoaded', () => {
         document.getElementById('fileName').textContent = file ? file.name : '';
     });
 
+    function handleAnalyzeEvent(data) {
+        switch (data.type) {
+            case 'document':
+                currentDocumentText = data.original_document;
+                document.getElementById('filledDocumentOutput').textContent = data.filled_document;
+                document.getElementById('keyFactsOutput').innerHTML = '<em>Analyzing...</em>';
+                document.getElementById('riskAnalysisOutput').innerHTML = '<em>Analyzing...</em>';
+                document.getElementById('lifespanOutput').innerHTML = '<em>Analyzing...</em>';
+                document.getElementById('loader').classList.add('hidden');
+                document.getElementById('dashboard').classList.remove('hidden');
+                break;
+            case 'key_facts':
+                document.getElementById('keyFactsOutput').innerHTML = data.html;
+                break;
+            case 'risk_analysis':
+                document.getElementById('riskAnalysisOutput').innerHTML = data.html;
+                break;
+            case 'lifespan':
+                document.getElementById('lifespanOutput').innerHTML = data.html;
+                break;
+            case 'negotiation':
+                negotiationHistory = data.history || [];
+                negotiationSessionId = data.session_id || null;
+                document.getElementById('negotiationOutput').innerHTML = `<div class="ai-msg">${data.start || ''}</div>`;
+                break;
+            case 'error':
+                throw new Error(data.detail || 'Analysis failed');
+        }
+    }
+
     document.getElementById('analyzeBtn').addEventListener('click', async () => {
         const file = document.getElementById('documentUpload').files[0];
         if (!file) { alert("Please upload a document."); return; }
@@ -539,18 +1072,33 @@ document.addEventListener('DOMContentLoaded', () => {
         formData.append('file', file);
         formData.append('user_name', document.getElementById('autofillName').value);
         formData.append('language', langSelector.value);
-        const data = await fetchAPI('/analyze', formData, 'POST', false);
-        document.getElementById('loader').classList.add('hidden');
-        if (data) {
-            currentDocumentText = data.original_document;
-            document.getElementById('keyFactsOutput').innerHTML = data.key_facts;
-            document.getElementById('riskAnalysisOutput').innerHTML = data.risk_analysis;
-            document.getElementById('lifespanOutput').innerHTML = data.lifespan;
-            document.getElementById('filledDocumentOutput').textContent = data.filled_document;
-            negotiationHistory = data.negotiation_history || [];
-            document.getElementById('negotiationOutput').innerHTML = `<div class="ai-msg">${data.negotiation_start || ''}</div>`;
-            document.getElementById('dashboard').classList.remove('hidden');
+        try {
+            // The server streams each dashboard section as a server-sent event,
+            // so cards fill in as soon as their content is ready.
+            const response = await fetch('/analyze', { method: 'POST', body: formData });
+            if (!response.ok) {
+                const err = await response.json().catch(() => ({ detail: 'Server error with non-JSON response' }));
+                throw new Error(err.detail);
+            }
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buf = '';
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buf += decoder.decode(value, { stream: true });
+                const events = buf.split('\\n\\n');
+                buf = events.pop();
+                for (const evt of events) {
+                    const line = evt.split('\\n').find(l => l.startsWith('data: '));
+                    if (line) handleAnalyzeEvent(JSON.parse(line.slice(6)));
+                }
+            }
+        } catch (error) {
+            console.error('API Error (/analyze):', error);
+            alert(`An error occurred: ${error.message}`);
         }
+        document.getElementById('loader').classList.add('hidden');
     });
     
     // --- Interactive Feature Handlers (Corrected) ---
@@ -594,7 +1142,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const negOutput = document.getElementById('negotiationOutput');
             negOutput.innerHTML += `<div class="user-msg">${message}</div>`;
             negOutput.scrollTop = negOutput.scrollHeight;
-            return { history: negotiationHistory, user_message: message };
+            return { history: negotiationHistory, user_message: message, session_id: negotiationSessionId };
         },
         (res) => {
             negotiationHistory = res.updated_history;
@@ -669,91 +1217,291 @@ document.addEventListener('DOMContentLoaded', () => {
 });
 """
 
+# CSS/JS are written out as real static assets once at import: browsers cache
+# them (StaticFiles serves ETag/Last-Modified) and GET / shrinks to the HTML
+# skeleton. GZipMiddleware compresses both the page and the assets on the wire.
+_STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+
+def _write_static_asset(name: str, content: str):
+    path = os.path.join(_STATIC_DIR, name)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp, path)  # atomic, so concurrent worker startup is safe
+
+
+os.makedirs(_STATIC_DIR, exist_ok=True)
+_write_static_asset("app.css", CSS_CODE)
+_write_static_asset("app.js", JS_CODE)
+
+# Rendered once at import; GET / serves precomputed bytes.
+_HOME_HTML = HTML_TEMPLATE
+_HOME_ETAG = f'"{hashlib.md5(_HOME_HTML.encode("utf-8")).hexdigest()}"'
+
 # --- 6. STARTUP/SHUTDOWN & APP INITIALIZATION ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global EXTRACT_EXECUTOR
     print("🚀 Running application startup logic...")
     db = SessionLocal()
     try:
-        seed_sample_laws(db)
+        # Sync SQLAlchemy work stays off the event loop, even at startup -
+        # uvicorn begins accepting connections while the seed runs.
+        await asyncio.to_thread(seed_sample_laws, db)
     finally:
         db.close()
+    EXTRACT_EXECUTOR = ProcessPoolExecutor(max_workers=int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 2))))
+    suggestion_task = asyncio.create_task(_suggestion_writer())
     print("✅ Application startup complete.")
     yield
+    suggestion_task.cancel()
+    EXTRACT_EXECUTOR.shutdown(wait=False)
+    EXTRACT_EXECUTOR = None
     print("🌙 Application shutting down.")
 
-app = FastAPI(title="Legal AI Dashboard (Final)", lifespan=lifespan)
+app = FastAPI(title="Legal AI Dashboard (Final)", lifespan=lifespan, default_response_class=ORJSONResponse)
+
+
+class _GZipExceptSSE:
+    """GZipMiddleware, except for the /analyze event stream.
+
+    zlib buffers input until a deflate block fills, so gzipping SSE withholds
+    the small per-section events and delivers them in batches - silently
+    undoing the progressive rendering the stream exists for.
+    """
+
+    def __init__(self, app, **gzip_kwargs):
+        self.app = app
+        self.gzip = GZipMiddleware(app, **gzip_kwargs)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/analyze":
+            await self.app(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
+
+
+app.add_middleware(_GZipExceptSSE, minimum_size=1024)
+app.mount("/static", StaticFiles(directory=_STATIC_DIR), name="static")
 
 # --- 7. API ROUTES ---
 @app.get("/", response_class=HTMLResponse)
-async def home():
-    return HTML_TEMPLATE.replace("{{ css_code }}", CSS_CODE).replace("{{ js_code }}", JS_CODE)
+async def home(request: Request):
+    if request.headers.get("if-none-match") == _HOME_ETAG:
+        return Response(status_code=304)
+    return HTMLResponse(_HOME_HTML, headers={"ETag": _HOME_ETAG, "Cache-Control": "public, max-age=3600"})
+
+# Section markers for the streamed combined analysis. Unlike JSON, a delimited
+# layout can be parsed incrementally, so each section is pushed to the client
+# the moment its terminator arrives in the Gemini stream.
+_ANALYZE_SECTIONS = ("key_facts", "risk_analysis", "lifespan")
+_ANALYZE_MARKERS = ("<<<KEY_FACTS>>>", "<<<RISK_ANALYSIS>>>", "<<<LIFESPAN>>>", "<<<END>>>")
+
+
+def _sse(payload: dict) -> bytes:
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
 
 @app.post("/analyze")
 async def analyze_document(user_name: str = Form(""), language: str = Form(...), file: UploadFile = File(...)):
-    doc_text = extract_text_from_file(file)
+    # PyMuPDF/python-docx parsing is CPU-bound; it runs in the process pool.
+    doc_text = await extract_text_from_file(file)
     filled_doc = doc_text.replace("[Your Name]", user_name or "[[Your Name]]")
     lang_name = language or "English"
-    risk_prompt = f"""Analyze all potential risks in the legal document. For each risk, create an HTML element.
+    # Put the document (the large, shared block) first and the tiny task-specific tail
+    # last, so all three prompts share an identical prefix and the provider's prompt
+    # caching can reuse the prefill KV cache across the calls.
+    prefix = f"DOCUMENT:\n{filled_doc}\n\nRESPOND IN {lang_name}.\n\n"
+    risk_task = """TASK: Analyze all potential risks in the legal document above. For each risk, create an HTML element.
 - For HIGH risks (major financial loss, liability), use: <div class='risk-item risk-high'><strong>High Risk:</strong> [Description]</div>
 - For MODERATE risks (unfavorable terms, negotiation points), use: <div class='risk-item risk-caution'><strong>Moderate Risk:</strong> [Description]</div>
-Respond only with HTML in {lang_name}. Document:\n{filled_doc}"""
-    prompts = [
-        f"Extract key facts (parties, dates, amounts) as HTML. Respond in {lang_name}.\n\n{filled_doc}",
-        risk_prompt,
-        f"Create a legal timeline (key dates, deadlines) as HTML. Respond in {lang_name}.\n\n{filled_doc}"
-    ]
-    key, risk, life = await asyncio.gather(*[get_ai_response(p) for p in prompts])
-    neg_hist = [{'role': 'user', 'parts': [f"You are a Landlord in Chennai. I am a Tenant. Start negotiating this document in {lang_name}.\n\n{filled_doc}"]}]
-    init_response_text = "AI negotiation is unavailable."
-    try:
-        if API_KEY:
-            chat = model.start_chat(history=neg_hist)
-            init_response = await chat.send_message_async("Start now.")
-            init_response_text = init_response.text
-            neg_hist.append({'role': 'model', 'parts': [init_response_text]})
-    except Exception as e:
-        init_response_text = f"AI negotiation failed: {e}"
-    return {'key_facts': key, 'risk_analysis': risk, 'lifespan': life, 'original_document': doc_text, 'filled_document': filled_doc, 'negotiation_start': init_response_text, 'negotiation_history': neg_hist}
+Respond only with HTML."""
+    section_tasks = {
+        'key_facts': prefix + "TASK: Extract key facts (parties, dates, amounts) from the document above as HTML.",
+        'risk_analysis': prefix + risk_task,
+        'lifespan': prefix + "TASK: Create a legal timeline (key dates, deadlines) from the document above as HTML.",
+    }
+    # One batched call: a single network round-trip and a single prefill of the
+    # (potentially long) document instead of three.
+    combined_task = """TASK: Produce ALL of the following three sections, in this exact order, each introduced by its marker on its own line:
+<<<KEY_FACTS>>>
+Key facts (parties, dates, amounts) from the document above, as HTML.
+<<<RISK_ANALYSIS>>>
+All potential risks in the document. For each risk emit an HTML element:
+<div class='risk-item risk-high'><strong>High Risk:</strong> [Description]</div> for HIGH risks (major financial loss, liability),
+<div class='risk-item risk-caution'><strong>Moderate Risk:</strong> [Description]</div> for MODERATE risks (unfavorable terms, negotiation points).
+<<<LIFESPAN>>>
+A legal timeline (key dates, deadlines) as HTML.
+Finish with the marker <<<END>>> on its own line. Output nothing outside the sections."""
+    combined_prompt = prefix + combined_task
+
+    async def event_gen():
+        try:
+            # The document itself is available immediately - let the UI render it
+            # while the model is still thinking.
+            yield _sse({'type': 'document', 'original_document': doc_text, 'filled_document': filled_doc})
+
+            cache_key = AIResponseCache.make_key(combined_prompt)
+            cached = AI_CACHE.get(cache_key)
+            if cached is not None:
+                for name in _ANALYZE_SECTIONS:
+                    yield _sse({'type': name, 'html': cached[name]})
+            elif not API_KEY or model is None:
+                for name in _ANALYZE_SECTIONS:
+                    yield _sse({'type': name, 'html': "AI API key not configured."})
+            else:
+                sections = {}
+                emitted = 0
+                try:
+                    stream = await model.generate_content_async(combined_prompt, stream=True)
+                    buffer = ""
+                    async for chunk in stream:
+                        buffer += getattr(chunk, "text", "") or ""
+                        # Emit a section as soon as the *next* marker shows up.
+                        while emitted < len(_ANALYZE_SECTIONS):
+                            start = buffer.find(_ANALYZE_MARKERS[emitted])
+                            end = buffer.find(_ANALYZE_MARKERS[emitted + 1])
+                            if start == -1 or end == -1 or end < start:
+                                break
+                            content = buffer[start + len(_ANALYZE_MARKERS[emitted]):end].strip()
+                            sections[_ANALYZE_SECTIONS[emitted]] = content
+                            yield _sse({'type': _ANALYZE_SECTIONS[emitted], 'html': content})
+                            emitted += 1
+                except Exception as e:
+                    print("AI Error (streamed analysis):", e)
+                if emitted < len(_ANALYZE_SECTIONS):
+                    # Model ignored the markers (or the stream died): fetch the
+                    # missing sections with the per-section prompts in parallel.
+                    remaining = _ANALYZE_SECTIONS[emitted:]
+                    results = await asyncio.gather(*[get_ai_response(section_tasks[name]) for name in remaining])
+                    for name, html in zip(remaining, results):
+                        sections[name] = html
+                        yield _sse({'type': name, 'html': html})
+                else:
+                    AI_CACHE.set(cache_key, sections)
+
+            neg_hist = [{'role': 'user', 'parts': [f"You are a Landlord in Chennai. I am a Tenant. Start negotiating this document in {lang_name}.\n\n{filled_doc}"]}]
+            init_response_text = "AI negotiation is unavailable."
+            negotiation_session_id = None
+            try:
+                if API_KEY and model is not None:
+                    chat = model.start_chat(history=neg_hist)
+                    init_response = await chat.send_message_async("Start now.")
+                    init_response_text = init_response.text
+                    neg_hist.append({'role': 'model', 'parts': [init_response_text]})
+                    negotiation_session_id = uuid.uuid4().hex
+                    await store_negotiation_session(negotiation_session_id, chat)
+            except Exception as e:
+                init_response_text = f"AI negotiation failed: {e}"
+            yield _sse({'type': 'negotiation', 'start': init_response_text, 'history': neg_hist, 'session_id': negotiation_session_id})
+            yield _sse({'type': 'done'})
+        except Exception as e:
+            print("🔴 /analyze stream failed:", e)
+            yield _sse({'type': 'error', 'detail': str(e)})
+
+    return StreamingResponse(event_gen(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# Wrapper and empty-state markup are fixed; build them once instead of
+# concatenating on every request (the empty case is the common one for
+# polled/no-result queries).
+_LAWS_HEADER = "<h4>Relevant Laws from Database</h4>"
+_LAWS_EMPTY = _LAWS_HEADER + "<p>No matching laws found.</p>"
+
+# Row template bound to str.format once at import; per-request rendering is
+# then one C-level format call per law.
+_LAW_ITEM_TMPL = (
+    "<div class='risk-item'><strong>{title}</strong><br/>"
+    "<small>{jurisdiction} — tags: {tags}</small><div>{text}</div></div>"
+).format
+
+# Prompt body bound to str.format once at import, same as the row template;
+# keeping the literal byte-identical across requests also keeps it eligible
+# for provider-side prefix caching.
+_LAW_PROMPT_TMPL = (
+    "You are a legal assistant. For the document excerpt below, identify relevant legal topics, explain why, "
+    "and propose 2 practical suggestions for someone in Chennai. Respond in {lang}.\n\n"
+    "Document excerpt:\n{doc}\n\n"
+    'Respond ONLY in this JSON format: {{"laws": [{{"title": "Law Title", "reason": "Explanation"}}], '
+    '"suggestions": ["Suggestion 1", "Suggestion 2"]}}'
+).format
+
+# Rendered law-search results keyed by (query, jurisdiction). The laws table
+# is only written at seed time, so a short TTL is purely a memory bound, not a
+# staleness concern; SuggestionRecord writes don't affect these results.
+_LAW_SEARCH_CACHE = AIResponseCache(ttl=int(os.getenv("LAW_CACHE_TTL", "300")))
+
 
 @app.post("/laws_search")
 async def laws_search(req: LawSearchRequest, db: Session = Depends(get_db)):
     q = (req.q or "").strip()
     jurisdiction = (req.jurisdiction or "").strip()
     if not q and req.document_text:
-        words = re.findall(r"\b[a-zA-Z]{5,}\b", req.document_text.lower())
-        top_words = sorted({w: words.count(w) for w in set(words)}.items(), key=lambda item: item[1], reverse=True)[:5]
-        q = " ".join([word for word, count in top_words])
+        # The extracted terms feed fts_match_expr, which ORs them as prefix phrases.
+        q = " ".join(extract_keywords(req.document_text))
+
+    # Popular jurisdictions and common top-word combos repeat constantly; a hit
+    # skips the DB round-trip and the HTML render entirely.
+    cache_key = f"{q}|{jurisdiction}"
+    laws_html = _LAW_SEARCH_CACHE.get(cache_key)
+    # The DB search (in a thread, so it doesn't block the loop) and the AI
+    # suggestion call are independent - run them concurrently.
+    laws_task = None if laws_html is not None else asyncio.to_thread(
+        simple_law_search, db, q or None, jurisdiction or None, 10
+    )
 
-    laws = simple_law_search(db, q=q or None, jurisdiction=jurisdiction or None, limit=10)
-    laws_html = "".join([f"<div class='risk-item'><strong>{law.title}</strong><br/><small>{law.jurisdiction} — tags: {law.tags}</small><div>{law.text[:800]}{'...' if len(law.text) > 800 else ''}</div></div>" for law in laws])
-    
     ai_raw_json = None
     if req.document_text and API_KEY and not req.q:
-        prompt = (f"You are a legal assistant. For the document excerpt below, identify relevant legal topics, explain why, "
-                  f"and propose 2 practical suggestions for someone in Chennai. Respond in {req.language or 'English'}.\n\n"
-                  f"Document excerpt:\n{req.document_text[:2000]}\n\n"
-                  f"Respond ONLY in this JSON format: {{\"laws\": [{{\"title\": \"Law Title\", \"reason\": \"Explanation\"}}], \"suggestions\": [\"Suggestion 1\", \"Suggestion 2\"]}}")
-        ai_raw_json = await get_ai_response(prompt)
-        try:
-            db.add(SuggestionRecord(source_doc_preview=req.document_text[:400], suggested_text=ai_raw_json[:2000], reason="AI law-match"))
-            db.commit()
-        except Exception as e:
-            print("Suggestion store error:", e)
-
-    return JSONResponse({
-        "laws_html": "<h4>Relevant Laws from Database</h4>" + (laws_html or "<p>No matching laws found.</p>"),
+        prompt = _LAW_PROMPT_TMPL(lang=req.language or "English", doc=req.document_text[:2000])
+        if laws_task is not None:
+            laws, ai_raw_json = await asyncio.gather(laws_task, get_ai_response(prompt))
+        else:
+            laws = None
+            ai_raw_json = await get_ai_response(prompt)
+    else:
+        laws = await laws_task if laws_task is not None else None
+
+    if laws_html is None:
+        # Generator feeds str.join directly - no throwaway intermediate list.
+        laws_html = "".join(
+            _LAW_ITEM_TMPL(
+                title=law.title,
+                jurisdiction=law.jurisdiction,
+                tags=law.tags,
+                text=law.text[:800] + ('...' if len(law.text) > 800 else ''),
+            )
+            for law in laws
+        )
+        _LAW_SEARCH_CACHE.set(cache_key, laws_html)
+
+    if ai_raw_json is not None:
+        await _SUGGESTION_QUEUE.put(SuggestionRecord(
+            source_doc_preview=req.document_text[:400], suggested_text=ai_raw_json[:2000], reason="AI law-match"
+        ))
+
+    return ORJSONResponse({
+        "laws_html": (_LAWS_HEADER + laws_html) if laws_html else _LAWS_EMPTY,
         "ai_suggestions_json": ai_raw_json
     })
 
+@app.post("/batch_ai")
+async def batch_ai(req: BatchAIRequest):
+    """Run a list of related prompts concurrently instead of one request per prompt."""
+    return {'responses': await get_ai_responses(req.prompts)}
+
 # (Other endpoints like compare_clauses, download_report, etc.)
+_COMPARE_PROMPT_TMPL = (
+    "Compare Clause A and B. Respond in {lang} with an HTML list of differences and risks.\nA:{a}\nB:{b}"
+).format
+
+
 @app.post("/compare_clauses")
 async def compare_clauses(req: CompareRequest):
-    prompt = f"Compare Clause A and B. Respond in {req.language} with an HTML list of differences and risks.\nA:{req.clause_a}\nB:{req.clause_b}"
+    prompt = _COMPARE_PROMPT_TMPL(lang=req.language, a=req.clause_a, b=req.clause_b)
     return {'comparison': await get_ai_response(prompt)}
 
-@app.post("/download_report")
-async def download_report(req: ReportRequest):
+def _build_pdf(req: ReportRequest) -> bytes:
+    """Render the report. Pure CPU work - callers must keep it off the event loop."""
     pdf = PDF()
     pdf.add_page()
     pdf.chapter_title("1. Key Facts & Figures")
@@ -762,13 +1510,53 @@ async def download_report(req: ReportRequest):
     pdf.write_html_content(req.risk_analysis)
     pdf.chapter_title("3. Auto-Filled Document Text")
     pdf.set_font("Courier", "", 9)
-    pdf.multi_cell(0, 5, sanitize_for_pdf(req.filled_document))
-    pdf_bytes = pdf.output(dest="S").encode("latin-1", "replace")
-    return StreamingResponse(io.BytesIO(pdf_bytes), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=Legal_AI_Report.pdf"})
+    # Already sanitized field-by-field by the ReportRequest validator.
+    pdf.multi_cell(0, 5, req.filled_document)
+    # fpdf2's output() already returns the document as a bytearray; the old
+    # dest="S" + latin-1 re-encode built two extra full copies.
+    return bytes(pdf.output())
+
+
+# PDF output is deterministic in the request body, so repeat downloads (users
+# re-clicking the button) can be answered from cache or a 304 instead of a
+# fresh fpdf render. Small max_entries because the values are whole PDFs.
+_PDF_CACHE = AIResponseCache(
+    ttl=int(os.getenv("PDF_CACHE_TTL", "600")),
+    max_entries=int(os.getenv("PDF_CACHE_MAX_ENTRIES", "64")),
+)
+
+
+@app.post("/download_report")
+async def download_report(req: ReportRequest, request: Request):
+    etag = '"' + hashlib.sha256(orjson.dumps(req.model_dump())).hexdigest() + '"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    pdf_bytes = _PDF_CACHE.get(etag)
+    if pdf_bytes is None:
+        # fpdf rendering is pure CPU; inline it would stall every other request
+        # on this worker for the duration.
+        pdf_bytes = await asyncio.to_thread(_build_pdf, req)
+        _PDF_CACHE.set(etag, pdf_bytes)
+
+    async def chunks():
+        mv = memoryview(pdf_bytes)
+        for i in range(0, len(mv), 65536):
+            yield bytes(mv[i:i + 65536])
+
+    return StreamingResponse(
+        chunks(),
+        media_type="application/pdf",
+        headers={"Content-Disposition": "attachment; filename=Legal_AI_Report.pdf", "ETag": etag},
+    )
+
+_ASK_PROMPT_TMPL = "Answer in {lang}. DOC:\n{doc}\n\nQ:\n{q}".format
+
 
 @app.post("/ask")
 async def ask_question(req: AskRequest):
-    prompt = f"Answer in {req.language}. DOC:\n{req.document_text}\n\nQ:\n{req.question}"
+    excerpt = _relevant_excerpts(req.document_text, req.question)
+    prompt = _ASK_PROMPT_TMPL(lang=req.language, doc=excerpt, q=req.question)
     return {'answer': await get_ai_response(prompt)}
 
 @app.post("/negotiate")
@@ -776,8 +1564,17 @@ async def negotiate(req: NegotiateRequest):
     history = req.history or []
     history.append({'role': 'user', 'parts': [req.user_message]})
     try:
-        chat = model.start_chat(history=history)
-        resp = await chat.send_message_async("Continue negotiation.")
+        chat = await get_negotiation_session(req.session_id) if req.session_id else None
+        if chat is not None:
+            # Live session: send only the new turn, the chat carries the history.
+            resp = await chat.send_message_async(req.user_message)
+        else:
+            # Session expired/evicted (or older client): rebuild from the supplied
+            # history, trimmed to a budget so long sessions don't balloon the prompt.
+            chat = model.start_chat(history=_trim_history(history))
+            resp = await chat.send_message_async("Continue negotiation.")
+            if req.session_id:
+                await store_negotiation_session(req.session_id, chat)
         history.append({'role': 'model', 'parts': [resp.text]})
         return {'ai_response': resp.text, 'updated_history': history}
     except Exception as e:
@@ -785,5 +1582,18 @@ async def negotiate(req: NegotiateRequest):
 
 # --- 8. RUN APP ---
 if __name__ == "__main__":
-   
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # uvloop + httptools ship with uvicorn[standard]; multiple workers keep one
+    # CPU-heavy PDF/docx extraction from starving every other request.
+    # Note: all in-process state (AI_CACHE, NEGOTIATION_SESSIONS, the law-search
+    # cache, the suggestion queue) is per worker - caches just warm
+    # independently, and a negotiation request landing on a different worker
+    # rebuilds the chat from the client-supplied history. Promote to Redis only
+    # if cross-worker sharing ever matters.
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 4))),
+        loop="uvloop",
+        http="httptools",
+    )
\ No newline at end of file